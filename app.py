@@ -1,9 +1,16 @@
 import os
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.io as pio
 import streamlit as st
 from dotenv import load_dotenv
+from numba import njit
 from datetime import datetime, timedelta, date
 
 # ---------------------------
@@ -17,6 +24,10 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 
+# st.plotly_chart serializes through plotly.io; orjson encodes the numpy and
+# datetime64 arrays natively instead of walking them in Python
+pio.json.config.default_engine = "orjson"
+
 # ---------------------------
 # 2. Streamlit page config
 # ---------------------------
@@ -26,118 +37,30 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Ultra-compact styling
-st.markdown("""
-    <style>
-    .main .block-container {
-        padding: 0 0.5rem;
-        max-width: 100%;
-    }
-    .main > div:first-child {
-        padding-top: 0 !important;
-    }
-    div[data-testid="stVerticalBlock"]:first-child {
-        padding-top: 0 !important;
-    }
-    .element-container {margin-bottom: 0 !important;}
-    div[data-testid="stVerticalBlock"] > div {gap: 0.2rem;}
-    
-    /* Cards */
-    .card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 6px;
-        padding: 8px 12px;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        height: 100%;
-        color: white;
-    }
-    .card-white {
-        background: white;
-        border-radius: 6px;
-        padding: 8px;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.06);
-        border: 1px solid #e5e7eb;
-        height: 100%;
-    }
-    
-    /* KPIs */
-    .kpi-value {
-        font-size: 1.6rem;
-        font-weight: 700;
-        line-height: 1;
-        margin: 2px 0;
-    }
-    .kpi-label {
-        font-size: 0.6rem;
-        opacity: 0.9;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Metrics */
-    .metric-box {
-        background: #f8fafc;
-        border-radius: 4px;
-        padding: 6px 8px;
-        border-left: 3px solid #667eea;
-        margin-bottom: 4px;
-    }
-    .metric-title {
-        font-size: 0.6rem;
-        color: #64748b;
-        font-weight: 600;
-        margin-bottom: 1px;
-    }
-    .metric-value {
-        font-size: 0.95rem;
-        color: #0f172a;
-        font-weight: 700;
-    }
-    
-    /* Headers */
-    .section-header {
-        font-size: 0.75rem;
-        font-weight: 700;
-        color: #1e293b;
-        margin-bottom: 5px;
-        display: flex;
-        justify-content: space-between;
-        align-items: baseline;
-    }
-    
-    h1 {
-        font-size: 1.3rem !important;
-        font-weight: 800 !important;
-        margin: 0 0 0.2rem 0 !important;
-        padding: 0 !important;
-        color: #1e293b;
-    }
-    
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: #ffffff;
-        border-right: 2px solid #e5e7eb;
-    }
-    [data-testid="stSidebar"] > div:first-child {
-        padding: 1rem;
-    }
-    
-    /* Hide default streamlit elements */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    /* Compact dataframe */
-    .stDataFrame {font-size: 0.7rem;}
-    </style>
-""", unsafe_allow_html=True)
+# Ultra-compact styling, kept in static/styles.css and read once per process
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(__file__), "static", "styles.css")) as f:
+        # collapse whitespace: this string is re-sent on every full rerun
+        return " ".join(f.read().split())
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # ---------------------------
 # 3. DB connection helper
 # ---------------------------
-def get_conn():
-    return psycopg2.connect(
+# Loaders are cached for CACHE_TTL seconds, so reruns within that window
+# never touch the DB. Cache misses borrow a connection from a shared pool.
+CACHE_TTL = 60
+# a session holds at most one connection at a time, so this caps how many
+# sessions can miss the cache at once; getconn raises PoolError past it
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+
+@st.cache_resource
+def get_pool():
+    # Threaded variant: Streamlit serves each session from its own thread
+    return psycopg2.pool.ThreadedConnectionPool(
+        2, DB_POOL_MAX,
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
@@ -145,10 +68,52 @@ def get_conn():
         password=DB_PASS,
     )
 
+@contextmanager
+def get_conn():
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    finally:
+        # read-only session: drop the implicit transaction before reuse. A
+        # dead connection fails here; discard it rather than leak the slot.
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        pool.putconn(conn, close=broken or bool(conn.closed))
+
+# NUMERIC columns come back as float instead of Decimal objects
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "DEC2FLOAT",
+    lambda value, cur: float(value) if value is not None else None,
+)
+psycopg2.extensions.register_type(DEC2FLOAT)
+
+# id columns repeat a handful of values: as categoricals the cached frames
+# pickle smaller on every cache hit and compare on integer codes
+ID_COLUMNS = ("line_id", "product_id", "material_id")
+
+def categorize_ids(df):
+    for col in ID_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+def read_df(conn, sql, params=None):
+    # plain cursor fetch: skips pandas' generic DBAPI wrapper around read_sql
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        columns = [col.name for col in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
 # ---------------------------
 # 4. Queries / data loaders
 # ---------------------------
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def load_schedule_df():
     sql = """
     SELECT
@@ -169,14 +134,14 @@ def load_schedule_df():
      AND lc.product_id = s.product_id
     ORDER BY s.production_date, s.line_id;
     """
-    conn = get_conn()
-    df = pd.read_sql(sql, conn)
-    conn.close()
-    return df
+    with get_conn() as conn:
+        df = read_df(conn, sql)
+    # parsed once per cache fill instead of on every Gantt build
+    df["production_date"] = pd.to_datetime(df["production_date"])
+    return categorize_ids(df)
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def load_kpi_data():
-    conn = get_conn()
-
     util_sql = """
     SELECT
         s.line_id,
@@ -191,15 +156,13 @@ def load_kpi_data():
     GROUP BY s.line_id, l.line_name, s.production_date, l.daily_capacity_cases
     ORDER BY s.production_date, s.line_id;
     """
-    df_util = pd.read_sql(util_sql, conn)
-
     flex_sql = "SELECT COUNT(*) AS flexible_slots_count FROM schedule WHERE is_firm = false;"
-    df_flex = pd.read_sql(flex_sql, conn)
-
     pend_sql = "SELECT COUNT(*) AS pending_dc_requests FROM dc_requests WHERE status = 'PENDING';"
-    df_pend = pd.read_sql(pend_sql, conn)
 
-    conn.close()
+    with get_conn() as conn:
+        df_util = categorize_ids(read_df(conn, util_sql))
+        df_flex = read_df(conn, flex_sql)
+        df_pend = read_df(conn, pend_sql)
 
     flexible_slots_count = int(df_flex.iloc[0]["flexible_slots_count"]) if len(df_flex) else 0
     pending_dc_requests = int(df_pend.iloc[0]["pending_dc_requests"]) if len(df_pend) else 0
@@ -208,6 +171,7 @@ def load_kpi_data():
 
     return flexible_slots_count, pending_dc_requests, active_lines, avg_util, df_util
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def load_inventory_summary():
     sql = """
     SELECT
@@ -220,14 +184,12 @@ def load_inventory_summary():
     ORDER BY m.supplier_lead_time_days DESC NULLS LAST
     LIMIT 3;
     """
-    conn = get_conn()
-    df = pd.read_sql(sql, conn)
-    conn.close()
+    with get_conn() as conn:
+        df = read_df(conn, sql)
     return df
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def load_dc_requests_summary():
-    conn = get_conn()  # you forgot this line in your code
-
     sql = """
         SELECT
             r.dc_name,
@@ -240,120 +202,187 @@ def load_dc_requests_summary():
         LIMIT 3;
     """
 
-    df = pd.read_sql(sql, conn)
-    conn.close()
+    with get_conn() as conn:
+        df = read_df(conn, sql)
     return df
 
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def load_master_data_for_sim():
-    conn = get_conn()
-
-    # removed s.order_id because it doesn't exist in your DB
-    schedule_sql = """
-    SELECT
-        s.line_id,
-        s.production_date,
-        s.product_id,
-        s.planned_qty_cases,
-        s.is_firm
-    FROM schedule s;
-    """
-    schedule_df = pd.read_sql(schedule_sql, conn)
-
-    lines_sql = """
+    # the simulator pulls its own filtered rows (load_sku_plan,
+    # allocate_new_capacity, load_sku_bom); the sidebar only needs the product list
+    products_sql = """
     SELECT
-        line_id,
-        line_name,
-        daily_capacity_cases
-    FROM lines;
+        product_id,
+        product_name
+    FROM products;
     """
-    lines_df = pd.read_sql(lines_sql, conn)
+    with get_conn() as conn:
+        products_df = read_df(conn, products_sql)
+    return {"products": products_df}
 
-    cap_sql = """
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def load_sku_plan(product_id, due_date_str):
+    # what is already planned for this SKU up to the due date
+    sql = """
     SELECT
-        line_id,
-        product_id,
-        rate_cases_per_hour
-    FROM line_capability;
+        s.line_id,
+        s.production_date,
+        s.planned_qty_cases
+    FROM schedule s
+    WHERE s.product_id = %(product_id)s
+      AND s.production_date <= %(due_date)s
+    ORDER BY s.production_date, s.line_id;
     """
-    cap_df = pd.read_sql(cap_sql, conn)
+    with get_conn() as conn:
+        return read_df(conn, sql, {"product_id": product_id, "due_date": due_date_str})
 
-    bom_sql = """
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def load_sku_bom(product_id):
+    sql = """
     SELECT
-        b.product_id,
         b.material_id,
         b.qty_per_case,
         m.material_name,
-        m.supplier_lead_time_days
+        m.supplier_lead_time_days,
+        i.on_hand_qty
     FROM bill_of_materials b
-    JOIN materials m ON m.material_id = b.material_id;
+    JOIN materials m ON m.material_id = b.material_id
+    LEFT JOIN inventory_materials i ON i.material_id = b.material_id
+    WHERE b.product_id = %(product_id)s;
     """
-    bom_df = pd.read_sql(bom_sql, conn)
+    with get_conn() as conn:
+        return read_df(conn, sql, {"product_id": product_id})
 
-    inv_sql = """
-    SELECT
-        i.material_id,
-        i.on_hand_qty
-    FROM inventory_materials i;
-    """
-    inv_df = pd.read_sql(inv_sql, conn)
+# ---------------------------
+# 5. Scenario simulator core (already updated logic)
+# ---------------------------
+# headroom cells pulled per round trip from the server-side cursor
+HEADROOM_FETCH_ROWS = 256
+
+@njit(cache=True)
+def greedy_fill(headroom, need):
+    # fill headroom cells in order until need is covered
+    alloc = np.zeros_like(headroom)
+    remaining = need
+    for i in range(headroom.size):
+        if remaining <= 0:
+            break
+        take = min(headroom[i], remaining)
+        alloc[i] = take
+        remaining -= take
+    return alloc, remaining
 
-    products_sql = """
-    SELECT
-        product_id,
-        product_name
-    FROM products;
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def allocate_new_capacity(product_id, due_date_str, need):
     """
-    products_df = pd.read_sql(products_sql, conn)
+    Greedily place `need` cases on free (day, line) capacity up to the due
+    date, earliest day first, then line_id.
 
-    conn.close()
-
-    return {
-        "schedule": schedule_df,
-        "lines": lines_df,
-        "capability": cap_df,
-        "bom": bom_df,
-        "inventory": inv_df,
-        "products": products_df,
-    }
+    Returns (capable, allocations, remaining) where allocations is a list of
+    (line_id, production_date, cases).
+    """
+    # Free capacity per (day, capable line), in fill order, followed by one
+    # NULL-date sentinel per capable line. A fully booked SKU still gets its
+    # sentinels back, so "no rows" only ever means no line can run it.
+    # Lines are ordered by line_id in byte order (COLLATE "C"), the same
+    # order main.py's simulator fills them in.
+    sql = """
+    WITH capable AS (
+        SELECT DISTINCT
+            lc.line_id COLLATE "C" AS line_id,
+            l.daily_capacity_cases
+        FROM line_capability lc
+        JOIN lines l ON l.line_id = lc.line_id
+        WHERE lc.product_id = %(product_id)s
+    ),
+    daily_load AS (
+        SELECT
+            line_id,
+            production_date,
+            SUM(planned_qty_cases) AS planned_cases
+        FROM schedule
+        WHERE production_date <= %(due_date)s
+        GROUP BY line_id, production_date
+    ),
+    days AS (
+        SELECT DISTINCT production_date FROM daily_load
+    ),
+    cells AS (
+        SELECT
+            c.line_id,
+            d.production_date,
+            GREATEST(c.daily_capacity_cases - COALESCE(dl.planned_cases, 0), 0) AS headroom_cases
+        FROM capable c
+        CROSS JOIN days d
+        LEFT JOIN daily_load dl
+               ON dl.line_id = c.line_id
+              AND dl.production_date = d.production_date
+    )
+    SELECT line_id, production_date, headroom_cases
+    FROM cells
+    WHERE headroom_cases > 0
+    UNION ALL
+    SELECT line_id, NULL, 0
+    FROM capable
+    ORDER BY production_date NULLS LAST, line_id;
+    """
 
-# ---------------------------
-# 5. Scenario simulator core (already updated logic)
-# ---------------------------
-def simulate_request(product_id, extra_cases, due_date_str, data):
+    capable = False
+    allocations = []
+    remaining = float(need)
+
+    with get_conn() as conn:
+        # server-side cursor: rows are shipped only as far as we read, so
+        # the scan stops as soon as the need is covered
+        with conn.cursor(name="sim_headroom") as cur:
+            cur.execute(sql, {"product_id": product_id, "due_date": due_date_str})
+            while remaining > 0:
+                rows = cur.fetchmany(HEADROOM_FETCH_ROWS)
+                if not rows:
+                    break
+                capable = True
+
+                slots = [row for row in rows if row[1] is not None]
+                if not slots:
+                    continue
+                headroom = np.array([row[2] for row in slots], dtype=np.float64)
+                alloc, remaining = greedy_fill(headroom, remaining)
+                for i in np.nonzero(alloc)[0]:
+                    line_id, prod_date, _ = slots[i]
+                    allocations.append((line_id, prod_date, int(alloc[i])))
+
+    return capable, allocations, remaining
+
+def simulate_request(product_id, extra_cases, due_date_str):
     """
     1. Check if already planned production before due_date covers the ask.
     2. If not, check available capacity (without touching firm) to add more.
     3. If capacity ok, check materials.
     4. Otherwise give partial and what's missing.
-    """
-    due_date_obj = pd.to_datetime(due_date_str).date()
-
-    schedule_df = data["schedule"].copy()
-    lines_df = data["lines"].copy()
-    cap_df = data["capability"].copy()
-    bom_df = data["bom"].copy()
-    inv_df = data["inventory"].copy()
 
-    schedule_df["production_date"] = pd.to_datetime(schedule_df["production_date"])
-    schedule_df["prod_date_only"] = schedule_df["production_date"].dt.date
+    Capacity is only scanned once step 1 falls short, and BOM rows only
+    once new production is actually needed.
+    """
+    due_date_obj = date.fromisoformat(due_date_str)
 
-    sched_window = schedule_df[schedule_df["prod_date_only"] <= due_date_obj].copy()
+    sku_sched = load_sku_plan(product_id, due_date_str)
 
     # STEP 1: already planned qty for this SKU before the due date
-    sku_sched = sched_window[sched_window["product_id"] == product_id].copy()
     already_planned_cases = sku_sched["planned_qty_cases"].sum() if len(sku_sched) else 0
 
     covering_rows = []
-    if len(sku_sched):
-        sku_sched_sorted = sku_sched.sort_values(["prod_date_only", "line_id"])
-        for _, r in sku_sched_sorted.iterrows():
-            covering_rows.append({
-                "line_id": r["line_id"],
-                "production_date": r["prod_date_only"],
-                "allocated_cases": int(r["planned_qty_cases"]),
-                "source": "already_planned"
-            })
+    for line_id, prod_date, qty in zip(
+        sku_sched["line_id"].values,
+        sku_sched["production_date"].values,
+        sku_sched["planned_qty_cases"].values,
+    ):
+        covering_rows.append({
+            "line_id": line_id,
+            "production_date": prod_date,
+            "allocated_cases": int(qty),
+            "source": "already_planned"
+        })
 
     if already_planned_cases >= extra_cases:
         msg = (
@@ -374,8 +403,10 @@ def simulate_request(product_id, extra_cases, due_date_str, data):
     need_after_plan = extra_cases - already_planned_cases
 
     # STEP 2: capacity for new production for this SKU
-    capable_lines = cap_df[cap_df["product_id"] == product_id]["line_id"].unique().tolist()
-    if not capable_lines:
+    capable, allocations, remaining_capacity_allocation = allocate_new_capacity(
+        product_id, due_date_str, int(need_after_plan)
+    )
+    if not capable:
         return {
             "can_fulfill": False,
             "allocated_total": int(already_planned_cases),
@@ -386,42 +417,15 @@ def simulate_request(product_id, extra_cases, due_date_str, data):
             "message": "We cannot run this SKU on any line."
         }
 
-    extra_plan_rows = []
-    remaining_capacity_allocation = need_after_plan
-
-    for this_date in sorted(sched_window["prod_date_only"].unique()):
-        if remaining_capacity_allocation <= 0:
-            break
-
-        for line_id in capable_lines:
-            if remaining_capacity_allocation <= 0:
-                break
-
-            line_info = lines_df[lines_df["line_id"] == line_id]
-            if line_info.empty:
-                continue
-            daily_capacity = int(line_info.iloc[0]["daily_capacity_cases"])
-
-            todays_runs = sched_window[
-                (sched_window["line_id"] == line_id) &
-                (sched_window["prod_date_only"] == this_date)
-            ]
-            total_planned_now = todays_runs["planned_qty_cases"].sum() if len(todays_runs) else 0
-
-            headroom = max(daily_capacity - total_planned_now, 0)
-            if headroom <= 0:
-                continue
-
-            allocate_now = min(headroom, remaining_capacity_allocation)
-
-            extra_plan_rows.append({
-                "line_id": line_id,
-                "production_date": this_date,
-                "allocated_cases": int(allocate_now),
-                "source": "new_plan"
-            })
-
-            remaining_capacity_allocation -= allocate_now
+    extra_plan_rows = [
+        {
+            "line_id": line_id,
+            "production_date": prod_date,
+            "allocated_cases": cases,
+            "source": "new_plan"
+        }
+        for line_id, prod_date, cases in allocations
+    ]
 
     new_capacity_cases = need_after_plan - remaining_capacity_allocation
     total_possible_capacity = already_planned_cases + new_capacity_cases
@@ -430,18 +434,17 @@ def simulate_request(product_id, extra_cases, due_date_str, data):
     # STEP 3: material check for only the NEW part
     mat_blockers = []
     if new_capacity_cases > 0:
-        sku_bom = bom_df[bom_df["product_id"] == product_id].copy()
+        sku_bom = load_sku_bom(product_id)
         if len(sku_bom):
-            sku_bom["needed_qty"] = sku_bom["qty_per_case"] * new_capacity_cases
-            merged = pd.merge(sku_bom, inv_df, on="material_id", how="left")
-            for _, r in merged.iterrows():
-                need = float(r["needed_qty"])
-                have = float(r["on_hand_qty"]) if pd.notnull(r["on_hand_qty"]) else 0.0
-                lead = r["supplier_lead_time_days"]
+            merged = sku_bom.assign(needed_qty=sku_bom["qty_per_case"] * new_capacity_cases)
+            for r in merged.itertuples(index=False):
+                need = float(r.needed_qty)
+                have = float(r.on_hand_qty) if pd.notnull(r.on_hand_qty) else 0.0
+                lead = r.supplier_lead_time_days
                 if need > have:
                     shortage = need - have
                     mat_blockers.append(
-                        f"{r['material_name']} short by {shortage:,.0f} (lead {lead}d)"
+                        f"{r.material_name} short by {shortage:,.0f} (lead {lead}d)"
                     )
         else:
             mat_blockers.append("No BOM for this SKU.")
@@ -516,20 +519,75 @@ def simulate_request(product_id, extra_cases, due_date_str, data):
 # ---------------------------
 # 6. Gantt chart
 # ---------------------------
+# past this many runs the SVG bars get sluggish; draw WebGL line segments instead
+GANTT_WEBGL_MIN_RUNS = 1000
+# on horizons longer than this, overlaid sub-hour runs are merged before plotting
+GANTT_MERGE_MIN_DAYS = 7
+
+def label_products(names):
+    # a merged bar names its product only when it really is a single one
+    unique = names.unique()
+    return unique[0] if len(unique) == 1 else f"{len(unique)} products"
+
+def merge_overlapping_runs(df):
+    # sub-hour runs on the same line, day and status all start at 08:00 and
+    # stack into slivers; collapse them into one bar carrying their combined
+    # cases and hours. Runs of an hour or more are plotted as they are.
+    short = df["hours_needed"] < 1
+    if not short.any():
+        return df
+    merged = (
+        df[short].groupby(
+            ["line_name", pd.Grouper(key="production_date", freq="D"), "is_firm"],
+            sort=False,
+        )
+        .agg(
+            product_name=("product_name", label_products),
+            planned_qty_cases=("planned_qty_cases", "sum"),
+            hours_needed=("hours_needed", "sum"),
+        )
+        .reset_index()
+    )
+    return pd.concat([df.loc[~short, merged.columns], merged], ignore_index=True)
+
+def gantt_segment_trace(start_dt, end_dt, line_names, customdata, color, hovertemplate):
+    # one [start, end, gap] triple per run, drawn as a thick horizontal line
+    n = len(start_dt)
+    x = np.full(3 * n, None, dtype=object)
+    x[0::3] = np.datetime_as_string(start_dt, unit="s")
+    x[1::3] = np.datetime_as_string(end_dt, unit="s")
+    y = np.full(3 * n, None, dtype=object)
+    y[0::3] = line_names
+    y[1::3] = line_names
+    return go.Scattergl(
+        x=x,
+        y=y,
+        mode='lines',
+        line=dict(color=color, width=14),
+        customdata=np.repeat(customdata, 3, axis=0),
+        hovertemplate=hovertemplate,
+        showlegend=False
+    )
 
-def build_gantt_figure(schedule_df):
+def build_gantt_figure(schedule_df, days=10):
     if schedule_df.empty:
         return None
 
-    df = schedule_df.copy()
-    df["production_date"] = pd.to_datetime(df["production_date"])
+    # production_date is already datetime64 (load_schedule_df); the window
+    # below is only read, so no copy is needed
+    df = schedule_df
 
     min_date = df["production_date"].min()
-    max_date = min_date + timedelta(days=9)
+    max_date = min_date + timedelta(days=days - 1)
 
-    df = df[df["production_date"] <= max_date].copy()
+    df = df[df["production_date"] <= max_date]
     if df.empty:
         return None
+    # the renderer is picked from the raw run count: merging exists to thin
+    # out the same dense horizons that need WebGL
+    use_webgl = len(df) >= GANTT_WEBGL_MIN_RUNS
+    if days > GANTT_MERGE_MIN_DAYS:
+        df = merge_overlapping_runs(df)
 
     lines = sorted(df["line_name"].unique(), reverse=True)
 
@@ -537,33 +595,58 @@ def build_gantt_figure(schedule_df):
     firm_color = "#10b981"
     flexible_color = "#fbbf24"
 
-    for _, row in df.iterrows():
-        prod_date = row["production_date"]
-        start_dt = datetime.combine(prod_date.date(), datetime.min.time()) + timedelta(hours=8)
-        end_dt = start_dt + timedelta(hours=float(row["hours_needed"]))
-
-        color = firm_color if row["is_firm"] else flexible_color
-        duration_ms = row["hours_needed"] * 3600000
-
+    # every run starts at 08:00 on its production day; bar length is in ms
+    prod_day = df["production_date"].values.astype("datetime64[D]")
+    start_dt = (prod_day + np.timedelta64(8, "h")).astype("datetime64[s]")
+    hours = df["hours_needed"].to_numpy(dtype=np.float64)
+    duration_ms = hours * 3600000
+    cases = df["planned_qty_cases"].to_numpy().astype(np.int64)
+    line_names = df["line_name"].to_numpy()
+    text = (df["product_name"].str[:15] + "<br>" + cases.astype(str) + "c").to_numpy()
+    customdata = np.column_stack([
+        df["product_name"].to_numpy(),
+        np.datetime_as_string(prod_day, unit="D"),
+        hours,
+        cases,
+    ])
+    is_firm = df["is_firm"].to_numpy(dtype=bool)
+
+    end_dt = start_dt + (hours * 3600).astype("timedelta64[s]")
+
+    # one trace per status instead of one per run
+    for mask, color, status in (
+        (is_firm, firm_color, "Firm"),
+        (~is_firm, flexible_color, "Flexible"),
+    ):
+        if not mask.any():
+            continue
+        hovertemplate = (
+            "<b>%{customdata[0]}</b><br>"
+            "Line: %{y}<br>"
+            "Date: %{customdata[1]}<br>"
+            "Start: 08:00<br>"
+            "Duration: %{customdata[2]:.1f}h<br>"
+            "Cases: %{customdata[3]}<br>"
+            f"Status: {status}<br>"
+            "<extra></extra>"
+        )
+        if use_webgl:
+            fig.add_trace(gantt_segment_trace(
+                start_dt[mask], end_dt[mask], line_names[mask],
+                customdata[mask], color, hovertemplate
+            ))
+            continue
         fig.add_trace(go.Bar(
-            x=[duration_ms],
-            y=[row["line_name"]],
-            base=start_dt,
+            x=duration_ms[mask],
+            y=line_names[mask],
+            base=start_dt[mask],
             orientation='h',
             marker=dict(color=color, line=dict(color='#1e293b', width=0.5)),
-            text=f"{row['product_name'][:15]}<br>{int(row['planned_qty_cases'])}c",
+            text=text[mask],
             textposition='inside',
             textfont=dict(size=8, color='white', family='monospace'),
-            hovertemplate=(
-                f"<b>{row['product_name']}</b><br>"
-                f"Line: {row['line_name']}<br>"
-                f"Date: {prod_date.strftime('%Y-%m-%d')}<br>"
-                f"Start: {start_dt.strftime('%H:%M')}<br>"
-                f"Duration: {row['hours_needed']:.1f}h<br>"
-                f"Cases: {int(row['planned_qty_cases'])}<br>"
-                f"Status: {'Firm' if row['is_firm'] else 'Flexible'}<br>"
-                "<extra></extra>"
-            ),
+            customdata=customdata[mask],
+            hovertemplate=hovertemplate,
             showlegend=False
         ))
 
@@ -595,26 +678,19 @@ def build_gantt_figure(schedule_df):
     return fig
 
 # ---------------------------
-# 7. Load data
+# 7. SIDEBAR SIMULATOR
 # ---------------------------
+# Both panels are fragments: a sidebar widget change reruns only the sidebar,
+# so the dashboard (and its Gantt figure) is not rebuilt and re-sent.
 
-schedule_df = load_schedule_df()
-flexible_slots, pending_dc, active_lines, avg_util, util_df = load_kpi_data()
-inv_top = load_inventory_summary()
-dc_top = load_dc_requests_summary()
-sim_data = load_master_data_for_sim()
+@st.fragment
+def render_sidebar():
+    sim_data = load_master_data_for_sim()
 
-# ---------------------------
-# 8. SIDEBAR SIMULATOR
-# ---------------------------
-
-with st.sidebar:
     st.markdown("### 🚀 Promo Request Simulation")
-    
-    product_options = {
-        row["product_name"]: row["product_id"]
-        for _, row in sim_data["products"].iterrows()
-    }
+
+    products_df = sim_data["products"]
+    product_options = dict(zip(products_df["product_name"].values, products_df["product_id"].values))
     product_display_names = list(product_options.keys())
     selected_product_name = st.selectbox("Product", options=product_display_names, key="sim_prod")
     selected_product_id = product_options[selected_product_name]
@@ -628,8 +704,7 @@ with st.sidebar:
         result = simulate_request(
             product_id=selected_product_id,
             extra_cases=int(requested_qty),
-            due_date_str=str(due_date_input),
-            data=sim_data
+            due_date_str=str(due_date_input)
         )
 
         st.markdown("---")
@@ -644,7 +719,19 @@ with st.sidebar:
                 "allocated_cases": "Cases",
                 "source": "Source"
             })
-            st.dataframe(plan_df, use_container_width=True, height=200)
+            # plain Arrow-friendly dtypes; formatting is done by the frontend
+            plan_df = plan_df.astype({"Line": "category", "Source": "category", "Cases": "int32"})
+            plan_df["Date"] = pd.to_datetime(plan_df["Date"])
+            st.dataframe(
+                plan_df,
+                use_container_width=True,
+                height=200,
+                hide_index=True,
+                column_config={
+                    "Date": st.column_config.DateColumn(format="YYYY-MM-DD"),
+                    "Cases": st.column_config.NumberColumn(format="%d"),
+                },
+            )
 
         if result["material_blockers"]:
             st.markdown("**⚠️ Material Constraints:**")
@@ -657,116 +744,143 @@ with st.sidebar:
                 st.markdown(f"- {c}")
 
 # ---------------------------
-# 9. MAIN DASHBOARD
+# 8. MAIN DASHBOARD
 # ---------------------------
 
-# Header
-col_h1, col_h2 = st.columns([3, 1])
-with col_h1:
-    st.markdown("# 🏭 Factory Control Tower")
-with col_h2:
+@st.fragment
+def render_dashboard():
+    schedule_df = load_schedule_df()
+    flexible_slots, pending_dc, active_lines, avg_util, util_df = load_kpi_data()
+    inv_top = load_inventory_summary()
+    dc_top = load_dc_requests_summary()
+
+    # Header
+    col_h1, col_h2 = st.columns([3, 1])
+    with col_h1:
+        st.markdown("# 🏭 Factory Control Tower")
+    with col_h2:
+        st.markdown(
+            f"<div style='text-align:right;padding-top:4px;'>"
+            f"<span style='font-size:0.65rem;color:#64748b;'>Updated: {datetime.now().strftime('%H:%M')}</span>"
+            f"</div>",
+            unsafe_allow_html=True
+        )
+
+    # KPIs
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(f"""
+        <div class="card">
+            <div class="kpi-label">ACTIVE LINES</div>
+            <div class="kpi-value">{active_lines}</div>
+        </div>
+        """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"""
+        <div class="card">
+            <div class="kpi-label">AVG UTILIZATION</div>
+            <div class="kpi-value">{avg_util:.0f}%</div>
+        </div>
+        """, unsafe_allow_html=True)
+    with col3:
+        st.markdown(f"""
+        <div class="card">
+            <div class="kpi-label">FLEXIBLE SLOTS</div>
+            <div class="kpi-value">{flexible_slots}</div>
+        </div>
+        """, unsafe_allow_html=True)
+    with col4:
+        st.markdown(f"""
+        <div class="card">
+            <div class="kpi-label">PENDING REQUESTS</div>
+            <div class="kpi-value">{pending_dc}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    # Gantt chart
+    st.markdown('<div class="card-white">', unsafe_allow_html=True)
     st.markdown(
-        f"<div style='text-align:right;padding-top:4px;'>"
-        f"<span style='font-size:0.65rem;color:#64748b;'>Updated: {datetime.now().strftime('%H:%M')}</span>"
-        f"</div>",
+        '<div class="section-header">📊 Production Schedule — Next 10 Days'
+        '<span style="font-size:0.6rem;font-weight:500;color:#64748b;">Green = firm / Yellow = flexible</span>'
+        '</div>',
         unsafe_allow_html=True
     )
 
-# KPIs
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.markdown(f"""
-    <div class="card">
-        <div class="kpi-label">ACTIVE LINES</div>
-        <div class="kpi-value">{active_lines}</div>
-    </div>
-    """, unsafe_allow_html=True)
-with col2:
-    st.markdown(f"""
-    <div class="card">
-        <div class="kpi-label">AVG UTILIZATION</div>
-        <div class="kpi-value">{avg_util:.0f}%</div>
-    </div>
-    """, unsafe_allow_html=True)
-with col3:
-    st.markdown(f"""
-    <div class="card">
-        <div class="kpi-label">FLEXIBLE SLOTS</div>
-        <div class="kpi-value">{flexible_slots}</div>
-    </div>
-    """, unsafe_allow_html=True)
-with col4:
-    st.markdown(f"""
-    <div class="card">
-        <div class="kpi-label">PENDING REQUESTS</div>
-        <div class="kpi-value">{pending_dc}</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-# Gantt chart
-st.markdown('<div class="card-white">', unsafe_allow_html=True)
-st.markdown(
-    '<div class="section-header">📊 Production Schedule — Next 10 Days'
-    '<span style="font-size:0.6rem;font-weight:500;color:#64748b;">Green = firm / Yellow = flexible</span>'
-    '</div>',
-    unsafe_allow_html=True
-)
-
-fig = build_gantt_figure(schedule_df)
-if fig is None:
-    st.info("No schedule data")
-else:
-    st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
-st.markdown('</div>', unsafe_allow_html=True)
-
-# Bottom row
-col_b1, col_b2, col_b3 = st.columns(3)
-
-with col_b1:
-    st.markdown('<div class="card-white">', unsafe_allow_html=True)
-    st.markdown('<div class="section-header">🔧 Capacity Hotspots</div>', unsafe_allow_html=True)
-    if not util_df.empty:
-        top3 = util_df.nlargest(3, "utilization_pct")[["line_name", "production_date", "utilization_pct"]]
-        for _, row in top3.iterrows():
-            st.markdown(f"""
-            <div class="metric-box">
-                <div class="metric-title">{row['line_name']} • {row['production_date'].strftime('%b %d')}</div>
-                <div class="metric-value">{row['utilization_pct']:.0f}%</div>
-            </div>
-            """, unsafe_allow_html=True)
+    fig = build_gantt_figure(schedule_df)
+    if fig is None:
+        st.info("No schedule data")
     else:
-        st.info("No data")
+        st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
     st.markdown('</div>', unsafe_allow_html=True)
 
-with col_b2:
-    st.markdown('<div class="card-white">', unsafe_allow_html=True)
-    st.markdown('<div class="section-header">📦 DC Requests</div>', unsafe_allow_html=True)
-    if not dc_top.empty:
-        for _, row in dc_top.iterrows():
-            status_color = "#10b981" if row['status'] == 'APPROVED' else "#f59e0b"
-            st.markdown(f"""
-            <div class="metric-box" style="border-left-color:{status_color};">
-                <div class="metric-title">{row['dc_name']} • {row['product_name'][:18]}</div>
-                <div class="metric-value">{int(row['requested_qty_cases'])} cases</div>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.info("No requests")
-    st.markdown('</div>', unsafe_allow_html=True)
+    # Bottom row: header and rows of each panel go out as a single markdown
+    # element (kept on one line each, so markdown doesn't read indented HTML
+    # as a code block)
+    col_b1, col_b2, col_b3 = st.columns(3)
+
+    with col_b1:
+        st.markdown('<div class="card-white">', unsafe_allow_html=True)
+        parts = ['<div class="section-header">🔧 Capacity Hotspots</div>']
+        if not util_df.empty:
+            top3 = util_df.nlargest(3, "utilization_pct")[["line_name", "production_date", "utilization_pct"]]
+            for row in top3.itertuples(index=False):
+                parts.append(
+                    '<div class="metric-box">'
+                    f'<div class="metric-title">{row.line_name} • {row.production_date.strftime("%b %d")}</div>'
+                    f'<div class="metric-value">{row.utilization_pct:.0f}%</div>'
+                    '</div>'
+                )
+            st.markdown("".join(parts), unsafe_allow_html=True)
+        else:
+            st.markdown(parts[0], unsafe_allow_html=True)
+            st.info("No data")
+        st.markdown('</div>', unsafe_allow_html=True)
+
+    with col_b2:
+        st.markdown('<div class="card-white">', unsafe_allow_html=True)
+        parts = ['<div class="section-header">📦 DC Requests</div>']
+        if not dc_top.empty:
+            for row in dc_top.itertuples(index=False):
+                status_color = "#10b981" if row.status == 'APPROVED' else "#f59e0b"
+                parts.append(
+                    f'<div class="metric-box" style="border-left-color:{status_color};">'
+                    f'<div class="metric-title">{row.dc_name} • {row.product_name[:18]}</div>'
+                    f'<div class="metric-value">{int(row.requested_qty_cases)} cases</div>'
+                    '</div>'
+                )
+            st.markdown("".join(parts), unsafe_allow_html=True)
+        else:
+            st.markdown(parts[0], unsafe_allow_html=True)
+            st.info("No requests")
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+    with col_b3:
+        st.markdown('<div class="card-white">', unsafe_allow_html=True)
+        parts = ['<div class="section-header">⚠️ Critical Materials</div>']
+        if not inv_top.empty:
+            for row in inv_top.itertuples(index=False):
+                lead_time = int(row.supplier_lead_time_days) if pd.notna(row.supplier_lead_time_days) else 0
+                parts.append(
+                    '<div class="metric-box">'
+                    f'<div class="metric-title">{row.material_name[:22]}</div>'
+                    f'<div class="metric-value">{int(row.on_hand_qty)} • {lead_time}d</div>'
+                    '</div>'
+                )
+            st.markdown("".join(parts), unsafe_allow_html=True)
+        else:
+            st.markdown(parts[0], unsafe_allow_html=True)
+            st.info("No data")
+        st.markdown('</div>', unsafe_allow_html=True)
 
+# ---------------------------
+# 9. Render
+# ---------------------------
 
-with col_b3:
-    st.markdown('<div class="card-white">', unsafe_allow_html=True)
-    st.markdown('<div class="section-header">⚠️ Critical Materials</div>', unsafe_allow_html=True)
-    if not inv_top.empty:
-        for _, row in inv_top.iterrows():
-            lead_time = int(row['supplier_lead_time_days']) if pd.notna(row['supplier_lead_time_days']) else 0
-            st.markdown(f"""
-            <div class="metric-box">
-                <div class="metric-title">{row['material_name'][:22]}</div>
-                <div class="metric-value">{int(row['on_hand_qty'])} • {lead_time}d</div>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.info("No data")
-    st.markdown('</div>', unsafe_allow_html=True)
+with st.sidebar:
+    # runs before any loader on this pass, so the panels below load fresh data
+    if st.button("🔄 Refresh", key="refresh_button", use_container_width=True):
+        st.cache_data.clear()
+    render_sidebar()
+
+render_dashboard()
@@ -0,0 +1,19 @@
+-- Read-path indexes for the dashboard (app.py) and the simulator.
+-- Safe to re-run: every statement is IF NOT EXISTS.
+
+-- load_schedule_df / load_kpi_data: ordered by production_date, line_id
+CREATE INDEX IF NOT EXISTS idx_schedule_date_line
+    ON schedule (production_date, line_id);
+
+-- load_sku_plan: one SKU's runs up to the due date
+CREATE INDEX IF NOT EXISTS idx_schedule_product_date
+    ON schedule (product_id, production_date);
+
+-- load_inventory_summary: top-N materials by supplier lead time
+CREATE INDEX IF NOT EXISTS idx_materials_lead
+    ON materials (supplier_lead_time_days DESC NULLS LAST);
+
+-- load_dc_requests_summary: only open requests are ever listed
+CREATE INDEX IF NOT EXISTS idx_dc_requests_status
+    ON dc_requests (status)
+    WHERE status IN ('PENDING', 'APPROVED');
@@ -1,14 +1,24 @@
+import asyncio
 import os
 import json
 import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
-import psycopg2
+import numpy as np
+import orjson
+import psycopg
 import pandas as pd
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from numba import njit
+from psycopg.types.numeric import FloatLoader
+from psycopg_pool import AsyncConnectionPool
 
 # -------------------------
 # ENV + APP SETUP
@@ -21,16 +31,39 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 
-app = FastAPI(title="Scheduling Agent API")
-
-def get_db_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS,
+# NUMERIC columns come back as float instead of Decimal objects. FloatLoader
+# only covers text-format results; the binary schedule queries cast their
+# quantities to bigint in SQL instead.
+psycopg.adapters.register_loader("numeric", FloatLoader)
+
+# opened at startup, so requests reuse connections instead of
+# paying a fresh connect + auth handshake each time
+POOL = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global POOL, _MASTER_LOCK
+    # created here so the lock belongs to the server's event loop
+    _MASTER_LOCK = asyncio.Lock()
+    POOL = AsyncConnectionPool(
+        min_size=1,
+        max_size=10,
+        kwargs={
+            "host": DB_HOST,
+            "port": DB_PORT,
+            "dbname": DB_NAME,
+            "user": DB_USER,
+            "password": DB_PASS,
+        },
+        open=False,
     )
+    await POOL.open()
+    # compile (or load from the on-disk cache) before the first request
+    greedy_fill(np.zeros(1, dtype=np.int64), 0)
+    yield
+    await POOL.close()
+
+app = FastAPI(title="Scheduling Agent API", lifespan=lifespan)
 
 # -------------------------
 # Pydantic request/response models
@@ -82,17 +115,12 @@ class BuildReplyOut(BaseModel):
 # DB loaders (pulled from your code)
 # -------------------------
 
-def load_master_data_for_sim_from_db(conn):
-    schedule_sql = """
-    SELECT
-        s.line_id,
-        s.production_date,
-        s.product_id,
-        s.planned_qty_cases,
-        s.is_firm
-    FROM schedule s;
-    """
+async def _fetch_df(cur) -> pd.DataFrame:
+    # rows straight off the cursor: no pd.read_sql wrapper, no type sniffing
+    columns = [col.name for col in cur.description]
+    return pd.DataFrame.from_records(await cur.fetchall(), columns=columns)
 
+async def load_master_data_for_sim_from_db(conn):
     lines_sql = """
     SELECT
         line_id,
@@ -134,73 +162,204 @@ def load_master_data_for_sim_from_db(conn):
     FROM products;
     """
 
-    schedule_df  = pd.read_sql(schedule_sql,  conn)
-    lines_df     = pd.read_sql(lines_sql,     conn)
-    cap_df       = pd.read_sql(cap_sql,       conn)
-    bom_df       = pd.read_sql(bom_sql,       conn)
-    inv_df       = pd.read_sql(inv_sql,       conn)
-    products_df  = pd.read_sql(products_sql,  conn)
+    queries = {
+        "lines":      lines_sql,
+        "capability": cap_sql,
+        "bom":        bom_sql,
+        "inventory":  inv_sql,
+        "products":   products_sql,
+    }
 
-    return {
-        "schedule":   schedule_df,
-        "lines":      lines_df,
-        "capability": cap_df,
-        "bom":        bom_df,
-        "inventory":  inv_df,
-        "products":   products_df,
+    # pipeline mode sends all queries before reading any result,
+    # so the load costs one network round-trip instead of one per table
+    async with conn.pipeline():
+        cursors = {name: await conn.execute(sql) for name, sql in queries.items()}
+
+    return {name: await _fetch_df(cur) for name, cur in cursors.items()}
+
+async def load_schedule_window(conn, product_id: str, requested_due_date: str, line_ids: list) -> dict:
+    """
+    Schedule inputs for one simulation, filtered and summed by Postgres:
+    planned cases per line and day up to the due date, plus this SKU's runs.
+    The daily load names lines by integer code (position in `line_ids`,
+    -1 if unknown) rather than by line_id string.
+    """
+    due_date_obj = pd.to_datetime(requested_due_date).date()
+    params = {"product_id": product_id, "due_date": due_date_obj, "line_ids": line_ids}
+
+    daily_load_sql = """
+    SELECT
+        production_date,
+        COALESCE(array_position(%(line_ids)s::text[], line_id::text) - 1, -1) AS line_code,
+        SUM(planned_qty_cases)::bigint AS planned_sum
+    FROM schedule
+    WHERE production_date <= %(due_date)s
+    GROUP BY production_date, line_id
+    ORDER BY production_date, line_id;
+    """
+
+    sku_schedule_sql = """
+    SELECT
+        line_id,
+        production_date,
+        planned_qty_cases::bigint AS planned_qty_cases
+    FROM schedule
+    WHERE product_id = %(product_id)s
+      AND production_date <= %(due_date)s
+    ORDER BY production_date, line_id;
+    """
+
+    # binary results: ints and dates arrive as raw values rather than text
+    # psycopg has to parse. The FloatLoader above doesn't apply to binary
+    # NUMERIC (SUM over bigint is NUMERIC), so quantities are cast to bigint
+    # here; a Decimal would also break greedy_fill.
+    async with conn.pipeline():
+        cursors = {
+            "daily_load":   await conn.execute(daily_load_sql, params, binary=True),
+            "sku_schedule": await conn.execute(sku_schedule_sql, params, binary=True),
+        }
+
+    window = {}
+    for name, cur in cursors.items():
+        df = await _fetch_df(cur)
+        # the simulator only ever compares whole days
+        df["production_date"] = pd.to_datetime(df["production_date"]).values.astype("datetime64[D]")
+        window[name] = df
+    return window
+
+def index_master_data(data: dict) -> dict:
+    """
+    Precompute the lookups simulate_request_core needs, once per load,
+    so a request does dict lookups instead of filtering DataFrames.
+    """
+    products_df = data["products"]
+    lines_df = data["lines"]
+    cap_df = data["capability"]
+
+    data["product_names"] = dict(zip(products_df["product_id"], products_df["product_name"]))
+
+    # lines get filled in line_id order, the same order app.py's dashboard
+    # simulation uses
+    data["capable_lines_by_sku"] = {
+        product_id: sorted(line_ids)
+        for product_id, line_ids in cap_df.groupby("product_id", sort=False)["line_id"].unique().items()
     }
 
+    # lines are handled as integer codes (their position in line_ids)
+    data["line_ids"] = lines_df["line_id"].tolist()
+    data["line_code"] = {line_id: code for code, line_id in enumerate(data["line_ids"])}
+    data["daily_cap_by_code"] = lines_df["daily_capacity_cases"].to_numpy(dtype=np.int64)
+
+    # per-SKU BOM as plain arrays with stock already joined on; materials
+    # missing from inventory count as zero on hand
+    bom_stock = pd.merge(data["bom"], data["inventory"], on="material_id", how="left")
+    data["bom_by_sku"] = {
+        product_id: {
+            "qty_per_case":  rows["qty_per_case"].to_numpy(dtype=float),
+            "on_hand_qty":   rows["on_hand_qty"].fillna(0).to_numpy(dtype=float),
+            "material_name": rows["material_name"].tolist(),
+            "lead_days":     rows["supplier_lead_time_days"].tolist(),
+        }
+        for product_id, rows in bom_stock.groupby("product_id", sort=False)
+    }
+
+    return data
+
+
+# -------------------------
+# MASTER DATA CACHE
+# -------------------------
+# Master tables change far less often than simulation requests arrive,
+# so they are loaded once and served from memory until the TTL runs out.
+
+MASTER_CACHE_TTL = 60  # seconds
+
+# version goes up on every reload; memoized results are keyed on it
+_MASTER_CACHE = {"data": None, "expires": 0.0, "version": 0}
+_MASTER_LOCK = None  # asyncio.Lock, created in lifespan
+
+async def get_master_data() -> dict:
+    if time.monotonic() < _MASTER_CACHE["expires"]:
+        return _MASTER_CACHE["data"]
+
+    async with _MASTER_LOCK:
+        # another request may have reloaded while we waited for the lock
+        if time.monotonic() >= _MASTER_CACHE["expires"]:
+            async with POOL.connection() as conn:
+                data = await load_master_data_for_sim_from_db(conn)
+            _MASTER_CACHE["data"] = index_master_data(data)
+            _MASTER_CACHE["version"] += 1
+            _MASTER_CACHE["expires"] = time.monotonic() + MASTER_CACHE_TTL
+        return _MASTER_CACHE["data"]
+
+async def invalidate_master_data():
+    # waits out a reload in flight, which may have read pre-write data
+    async with _MASTER_LOCK:
+        _MASTER_CACHE["expires"] = 0.0
+
 
 # -------------------------
 # CORE SIMULATION LOGIC
 # (refactored from your Streamlit simulate_request)
 # -------------------------
 
+@njit(cache=True)
+def greedy_fill(headroom, need):
+    # fill headroom cells in order until need is covered
+    alloc = np.zeros_like(headroom)
+    remaining = need
+    for i in range(headroom.size):
+        if remaining <= 0:
+            break
+        take = min(headroom[i], remaining)
+        alloc[i] = take
+        remaining -= take
+    return alloc, remaining
+
+def _plan_rows(line_ids, days, cases, source: str) -> List[Dict[str, Any]]:
+    # columns -> records only at the edge: dates are formatted in one
+    # vectorized call and each column is unboxed with a single tolist()
+    return [
+        {"line_id": line_id, "production_date": day, "allocated_cases": qty, "source": source}
+        for line_id, day, qty in zip(
+            line_ids,
+            np.datetime_as_string(days, unit="D").tolist(),
+            np.asarray(cases).astype(np.int64).tolist(),
+        )
+    ]
+
 def simulate_request_core(
     product_id: str,
     requested_qty_cases: int,
     requested_due_date: str,
     dc_name: str,
-    data: dict
+    data: dict,
+    window: dict
 ) -> dict:
     """
     Same logic as your simulate_request() in Streamlit,
     but returns a clean dict for API + email.
+    `window` is the per-request schedule from load_schedule_window.
     """
 
     due_date_obj = pd.to_datetime(requested_due_date).date()
 
-    schedule_df = data["schedule"].copy()
-    lines_df = data["lines"].copy()
-    cap_df = data["capability"].copy()
-    bom_df = data["bom"].copy()
-    inv_df = data["inventory"].copy()
-
-    products_df = data["products"]
-    row_match = products_df[products_df["product_id"] == product_id]
-    product_name = row_match.iloc[0]["product_name"] if not row_match.empty else product_id
-
-    schedule_df["production_date"] = pd.to_datetime(schedule_df["production_date"])
-    schedule_df["prod_date_only"] = schedule_df["production_date"].dt.date
+    product_name = data["product_names"].get(product_id, product_id)
 
-    # window = anything scheduled on/before due date
-    sched_window = schedule_df[schedule_df["prod_date_only"] <= due_date_obj].copy()
+    # window = anything scheduled on/before due date, already filtered in SQL
+    daily_load = window["daily_load"]
 
     # how much of this SKU is already planned by then?
-    sku_sched = sched_window[sched_window["product_id"] == product_id].copy()
+    sku_sched = window["sku_schedule"]
     already_planned_cases = sku_sched["planned_qty_cases"].sum() if len(sku_sched) else 0
 
     # build rows for existing (already planned)
-    covering_rows = []
-    if len(sku_sched):
-        sku_sched_sorted = sku_sched.sort_values(["prod_date_only", "line_id"])
-        for _, r in sku_sched_sorted.iterrows():
-            covering_rows.append({
-                "line_id": str(r["line_id"]),
-                "production_date": str(r["prod_date_only"]),
-                "allocated_cases": int(r["planned_qty_cases"]),
-                "source": "already_planned"
-            })
+    covering_rows = _plan_rows(
+        sku_sched["line_id"].astype(str).tolist(),
+        sku_sched["production_date"].to_numpy("datetime64[D]"),
+        sku_sched["planned_qty_cases"].to_numpy(),
+        "already_planned",
+    )
 
     # CASE A: already fully covered
     if already_planned_cases >= requested_qty_cases:
@@ -232,7 +391,7 @@ def simulate_request_core(
     need_after_plan = requested_qty_cases - already_planned_cases
 
     # check which lines can run this SKU
-    capable_lines = cap_df[cap_df["product_id"] == product_id]["line_id"].unique().tolist()
+    capable_lines = data["capable_lines_by_sku"].get(product_id, [])
     if not capable_lines:
         return {
             "sku": product_id,
@@ -258,43 +417,45 @@ def simulate_request_core(
         }
 
     # try to allocate more capacity on those capable lines (same horizon)
-    extra_plan_rows = []
-    remaining_capacity_allocation = need_after_plan
-
-    for this_date in sorted(sched_window["prod_date_only"].unique()):
-        if remaining_capacity_allocation <= 0:
-            break
-
-        for line_id in capable_lines:
-            if remaining_capacity_allocation <= 0:
-                break
-
-            line_info = lines_df[lines_df["line_id"] == line_id]
-            if line_info.empty:
-                continue
-
-            daily_capacity = int(line_info.iloc[0]["daily_capacity_cases"])
-
-            todays_runs = sched_window[
-                (sched_window["line_id"] == line_id) &
-                (sched_window["prod_date_only"] == this_date)
-            ]
-            total_planned_now = todays_runs["planned_qty_cases"].sum() if len(todays_runs) else 0
-
-            headroom = max(daily_capacity - total_planned_now, 0)
-            if headroom <= 0:
-                continue
-
-            allocate_now = min(headroom, remaining_capacity_allocation)
-
-            extra_plan_rows.append({
-                "line_id": str(line_id),
-                "production_date": str(this_date),
-                "allocated_cases": int(allocate_now),
-                "source": "new_plan"
-            })
-
-            remaining_capacity_allocation -= allocate_now
+    line_code = data["line_code"]
+    fill_lines = [line_id for line_id in capable_lines if line_id in line_code]
+    fill_codes = np.array([line_code[line_id] for line_id in fill_lines], dtype=np.intp)
+    n_lines = len(fill_lines)
+
+    # rows arrive ordered by day, so the distinct days fall out of one
+    # linear pass instead of a sort
+    days = daily_load["production_date"].to_numpy("datetime64[D]")
+    new_day = np.empty(len(days), dtype=bool)
+    new_day[:1] = True
+    new_day[1:] = days[1:] != days[:-1]
+    dates = days[new_day]
+    date_idx = np.cumsum(new_day) - 1
+
+    # matrix column for each line code, -1 for lines we don't fill; the extra
+    # last slot is what code -1 (line not in the lines table) indexes into
+    col_by_code = np.full(len(line_code) + 1, -1, dtype=np.intp)
+    col_by_code[fill_codes] = np.arange(n_lines)
+    line_idx = col_by_code[daily_load["line_code"].to_numpy(dtype=np.intp)]
+    on_fill_line = line_idx >= 0
+
+    # (day x line) planned matrix: every scheduled day in the window, capable
+    # lines in line_id order, so raveling it gives the greedy fill order
+    planned = np.zeros((len(dates), n_lines), dtype=np.int64)
+    planned[date_idx[on_fill_line], line_idx[on_fill_line]] = daily_load["planned_sum"].to_numpy()[on_fill_line]
+
+    daily_cap = data["daily_cap_by_code"][fill_codes]
+    headroom = np.maximum(daily_cap[None, :] - planned, 0).ravel()
+
+    # compiled loop stops at the first cell that covers the need
+    allocated, remaining_capacity_allocation = greedy_fill(headroom, need_after_plan)
+
+    cells = np.flatnonzero(allocated)
+    extra_plan_rows = _plan_rows(
+        np.asarray(fill_lines, dtype=object)[cells % n_lines].tolist(),
+        dates[cells // n_lines],
+        allocated[cells],
+        "new_plan",
+    )
 
     new_capacity_cases = need_after_plan - remaining_capacity_allocation
     total_possible_capacity = already_planned_cases + new_capacity_cases
@@ -303,19 +464,16 @@ def simulate_request_core(
     # material check for the EXTRA part only
     mat_blockers = []
     if new_capacity_cases > 0:
-        sku_bom = data["bom"][data["bom"]["product_id"] == product_id].copy()
-        if len(sku_bom):
-            sku_bom["needed_qty"] = sku_bom["qty_per_case"] * new_capacity_cases
-            merged = pd.merge(sku_bom, data["inventory"], on="material_id", how="left")
-            for _, r in merged.iterrows():
-                need = float(r["needed_qty"])
-                have = float(r["on_hand_qty"]) if pd.notnull(r["on_hand_qty"]) else 0.0
-                lead = r["supplier_lead_time_days"]
-                if need > have:
-                    shortage = need - have
-                    mat_blockers.append(
-                        f"{r['material_name']} short by {shortage:,.0f} (lead {lead}d)"
-                    )
+        sku_bom = data["bom_by_sku"].get(product_id)
+        if sku_bom is not None:
+            needed = sku_bom["qty_per_case"] * new_capacity_cases
+            have = sku_bom["on_hand_qty"]
+            # one vector compare; strings only for the materials that fall short
+            for i in np.flatnonzero(needed > have):
+                shortage = needed[i] - have[i]
+                mat_blockers.append(
+                    f"{sku_bom['material_name'][i]} short by {shortage:,.0f} (lead {sku_bom['lead_days'][i]}d)"
+                )
         else:
             mat_blockers.append("No BOM defined for this SKU")
 
@@ -371,6 +529,17 @@ def simulate_request_core(
 
     status_val = "partial" if total_feasible > 0 else "no"
 
+    explanation_parts = [
+        f"We can cover {int(total_feasible)} cases of {product_name} "
+        f"by {due_date_obj}. The remaining {int(remaining_after_feasible)} "
+        f"cases cannot be produced on time. "
+    ]
+    if capacity_shortfall > 0:
+        explanation_parts.append("Capacity is limiting. ")
+    if mat_blockers:
+        explanation_parts.append("Material risk: ")
+        explanation_parts.append("; ".join(mat_blockers))
+
     return {
         "sku": product_id,
         "product_name": product_name,
@@ -389,13 +558,7 @@ def simulate_request_core(
         "capacity_notes": cap_notes,
         "material_notes": mat_blockers,
 
-        "explanation": (
-            f"We can cover {int(total_feasible)} cases of {product_name} "
-            f"by {due_date_obj}. The remaining {int(remaining_after_feasible)} "
-            f"cases cannot be produced on time. "
-            + ("Capacity is limiting. " if capacity_shortfall > 0 else "")
-            + ("Material risk: " + "; ".join(mat_blockers) if len(mat_blockers) > 0 else "")
-        ),
+        "explanation": "".join(explanation_parts),
     }
 
 
@@ -482,6 +645,13 @@ def build_dc_reply(sim_result: dict) -> str:
 # For now we make it dumb but working.
 # Later we replace with OpenAI call.
 
+# compiled once at import instead of looked up on every call
+_RE_K = re.compile(r"(\d+)\s*k", re.IGNORECASE)
+_RE_NUM = re.compile(r"\b(\d{3,})\b")
+_RE_DATE = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
+_RE_DC = re.compile(r"\b([A-Z][a-zA-Z]+(?:\s+DC))\b")
+_RE_SKU = re.compile(r"\b([A-Z0-9]+_[A-Z0-9_]+)\b")
+
 def parse_dc_email_with_llm(raw_email_text: str) -> dict:
     """
     TEMP VERSION:
@@ -491,8 +661,8 @@ def parse_dc_email_with_llm(raw_email_text: str) -> dict:
     """
     # qty: catch "12k" or "12000"
     qty_requested = None
-    m_k = re.search(r"(\d+)\s*k", raw_email_text, re.IGNORECASE)
-    m_num = re.search(r"\b(\d{3,})\b", raw_email_text)
+    m_k = _RE_K.search(raw_email_text)
+    m_num = _RE_NUM.search(raw_email_text)
 
     if m_k:
         qty_requested = int(m_k.group(1)) * 1000
@@ -500,15 +670,15 @@ def parse_dc_email_with_llm(raw_email_text: str) -> dict:
         qty_requested = int(m_num.group(1))
 
     # date ISO like 2025-11-03
-    m_date_iso = re.search(r"\b(20\d{2}-\d{2}-\d{2})\b", raw_email_text)
+    m_date_iso = _RE_DATE.search(raw_email_text)
     requested_date = m_date_iso.group(1) if m_date_iso else None
 
     # very naive DC name guess (looks for 'DC' word)
-    m_dc = re.search(r"\b([A-Z][a-zA-Z]+(?:\s+DC))\b", raw_email_text)
+    m_dc = _RE_DC.search(raw_email_text)
     dc_name = m_dc.group(1) if m_dc else None
 
     # very naive SKU guess (first ALLCAPS token with underscore)
-    m_sku = re.search(r"\b([A-Z0-9]+_[A-Z0-9_]+)\b", raw_email_text)
+    m_sku = _RE_SKU.search(raw_email_text)
     sku = m_sku.group(1) if m_sku else None
 
     return {
@@ -524,32 +694,70 @@ def parse_dc_email_with_llm(raw_email_text: str) -> dict:
 # -------------------------
 
 @app.post("/parse_dc_email", response_model=EmailParseOut)
-def parse_dc_email(body: EmailParseIn):
+async def parse_dc_email(body: EmailParseIn):
     parsed = parse_dc_email_with_llm(body.raw_email)
     return parsed
 
-@app.post("/simulate_request", response_model=SimulateOut)
-def simulate_request(body: SimulateIn):
-    conn = get_db_conn()
-    try:
-        data = load_master_data_for_sim_from_db(conn)
-        result = simulate_request_core(
-            product_id=body.sku,
-            requested_qty_cases=body.qty_requested,
-            requested_due_date=body.requested_date,
-            dc_name=body.dc_name,
-            data=data
-        )
-    finally:
-        conn.close()
+# Identical requests within one master-data version are answered from
+# memory, without a schedule read. The version is part of the key, so a
+# reload or /invalidate_cache makes every older entry unreachable.
+SIM_MEMO_SIZE = 4096
+_SIM_MEMO = OrderedDict()
+
+async def _simulate_cached(product_id: str, qty: int, due_date: str, dc_name: str) -> dict:
+    data = await get_master_data()
+    key = (product_id, qty, due_date, dc_name, _MASTER_CACHE["version"])
+    result = _SIM_MEMO.get(key)
+    if result is not None:
+        _SIM_MEMO.move_to_end(key)
+        return result
+
+    async with POOL.connection() as conn:
+        window = await load_schedule_window(conn, product_id, due_date, data["line_ids"])
+    # pandas / numba work runs off the event loop
+    result = await run_in_threadpool(
+        simulate_request_core,
+        product_id=product_id,
+        requested_qty_cases=qty,
+        requested_due_date=due_date,
+        dc_name=dc_name,
+        data=data,
+        window=window
+    )
+
+    _SIM_MEMO[key] = result
+    if len(_SIM_MEMO) > SIM_MEMO_SIZE:
+        _SIM_MEMO.popitem(last=False)
     return result
 
+# response_model stays for the OpenAPI docs; returning a Response skips
+# FastAPI's encode + validate pass, and orjson serializes in C
+@app.post("/simulate_request", response_model=SimulateOut)
+async def simulate_request(body: SimulateIn):
+    result = await _simulate_cached(
+        body.sku,
+        body.qty_requested,
+        body.requested_date,
+        body.dc_name,
+    )
+    return Response(
+        content=orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type="application/json",
+    )
+
+@app.post("/invalidate_cache")
+async def invalidate_cache():
+    # call after writing to schedule / master tables
+    await invalidate_master_data()
+    _SIM_MEMO.clear()
+    return {"status": "ok"}
+
 @app.post("/build_reply", response_model=BuildReplyOut)
-def build_reply(body: BuildReplyIn):
+async def build_reply(body: BuildReplyIn):
     reply_txt = build_dc_reply(body.sim_result)
     return {"reply_text": reply_txt} 
 
 
 @app.get("/")
-def root():
+async def root():
     return {"status": "ok", "message": "Scheduling Agent API is running"}